@@ -1,4 +1,10 @@
+import argparse
+import hashlib
 import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 import os
@@ -98,20 +104,236 @@ payloads = [
 
 agent_execute = "/_plugins/_ml/agents/{agent_id}/_execute"
 
-index = 0
-for agent in agents:
-    print(f"====={index} = {agent}====")
+ml_config_index = ".plugins-ml-config"
+# seconds a resolved name -> agent_id map is reused
+agent_id_cache_ttl = 300
+_agent_id_cache = {"expires_at": 0.0, "ids": {}}
+
+# on-disk cache of agent execute responses, used by --replay and --record
+response_cache_dir = os.getenv("AGENT_RESPONSE_CACHE_DIR", ".agent_response_cache")
+response_cache_max_bytes = int(os.getenv("AGENT_RESPONSE_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+response_cache_ttl = int(os.getenv("AGENT_RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def resolve_agent_id(agent: str) -> str:
     url = f"{host}{agent}"
-    print(url)
     # execute above url and get result
     response = requests.get(url=url, headers=headers, auth=auth)
-    print(response.text)
     # {"type": "os_olly_agent", "configuration": {"agent_id": "MI5-x5UB45eVFXptC2Sp"}}
     # parse response.text as json
-    agent_id = json.loads(str(response.text))['configuration']['agent_id']
+    return json.loads(str(response.text))['configuration']['agent_id']
+
+
+def config_name(agent: str) -> str:
+    # /_plugins/_ml/config/os_summary -> os_summary
+    return agent.rsplit('/', 1)[-1]
+
+
+def resolve_agent_ids(agent_paths: list[str]) -> dict[str, str]:
+    # read every os_* config document with one _mget and cache the name -> agent_id map for a while
+    names = [config_name(agent) for agent in agent_paths]
+    if _agent_id_cache["expires_at"] > time.monotonic() and all(name in _agent_id_cache["ids"] for name in names):
+        return {name: _agent_id_cache["ids"][name] for name in names}
+
+    agent_ids = {}
+    response = requests.post(url=f"{host}/{ml_config_index}/_mget", headers=headers, auth=auth, json={"ids": names})
+    result = response.json()
+    if 'error' in result:
+        print("mget agent configs failed, resolve one by one:", response.text)
+    else:
+        for doc in result['docs']:
+            if doc.get('found'):
+                agent_ids[doc['_id']] = doc['_source']['configuration']['agent_id']
+    # the config api still works for documents the multi-get could not read
+    for agent, name in zip(agent_paths, names):
+        if name not in agent_ids:
+            agent_ids[name] = resolve_agent_id(agent)
+
+    _agent_id_cache["ids"].update(agent_ids)
+    _agent_id_cache["expires_at"] = time.monotonic() + agent_id_cache_ttl
+    return agent_ids
+
+
+class CachedResponse:
+    # the parts of a requests.Response the sanity and benchmark runs read
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ResponseCache:
+    # one json file per request hash, least recently used files are evicted above max_bytes,
+    # entries older than ttl seconds are never served
+    def __init__(self, path: str, max_bytes: int, ttl: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(url: str, payload: dict) -> str:
+        canonical = json.dumps({"method": "POST", "url": url, "body": payload}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._file(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["stored_at"] > self.ttl:
+            return None
+        # the file mtime is the lru clock
+        os.utime(self._file(key))
+        return CachedResponse(entry["status_code"], entry["text"])
+
+    def put(self, key: str, response):
+        os.makedirs(self.path, exist_ok=True)
+        entry = {"status_code": response.status_code, "text": response.text, "stored_at": time.time()}
+        # write then rename, so a concurrent reader never sees a partial entry
+        tmp_file = f"{self._file(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_file, self._file(key))
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.path):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                total -= size
+
+
+response_cache = ResponseCache(response_cache_dir, response_cache_max_bytes, response_cache_ttl)
 
+
+def execute_agent(agent_id: str, payload: dict, cache_mode: str = "live"):
+    # live: always call the agent; replay: serve a cached response, call and cache on a miss;
+    # record: always call the agent and refresh the cached response
     execute_url = f"{host}{agent_execute}".replace("{agent_id}", agent_id)
-    response = requests.post(url=execute_url, headers=headers, auth=auth, json=payloads[index])
-    print("agent execute response: ", response.text)
+    key = ResponseCache.request_key(execute_url, payload)
+    if cache_mode == "replay":
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    response = requests.post(url=execute_url, headers=headers, auth=auth, json=payload)
+    # failed executions are not cached, the next replay retries them
+    if cache_mode != "live" and response.status_code == 200:
+        response_cache.put(key, response)
+    return response
+
+
+def run_sanity(cache_mode: str = "live"):
+    agent_ids = resolve_agent_ids(agents)
+    index = 0
+    for agent in agents:
+        print(f"====={index} = {agent}====")
+        agent_id = agent_ids[config_name(agent)]
+        print(f"agent_id: {agent_id}")
+
+        response = execute_agent(agent_id, payloads[index], cache_mode)
+        source = " (cached)" if isinstance(response, CachedResponse) else ""
+        print(f"agent execute response{source}: ", response.text)
+
+        index = index + 1
+
+
+def percentile(values: list[float], pct: float):
+    # nearest-rank percentile, values must be sorted
+    if len(values) == 0:
+        return None
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def run_benchmark(iterations: int, concurrency: int, output: str, cache_mode: str = "live"):
+    agent_ids = resolve_agent_ids(agents)
+
+    def timed_execute(agent: str, payload: dict):
+        start = time.monotonic()
+        try:
+            response = execute_agent(agent_ids[config_name(agent)], payload, cache_mode)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        end = time.monotonic()
+        return agent, start, end, ok
+
+    # iteration-first, so every agent has calls in flight from the start and all agents share the same load
+    calls = [(agent, payloads[index]) for _ in range(iterations) for index, agent in enumerate(agents)]
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        samples = list(executor.map(lambda call: timed_execute(*call), calls))
+
+    report = {}
+    for agent in agents:
+        agent_samples = [sample for sample in samples if sample[0] == agent]
+        latencies = sorted(end - start for _, start, end, _ in agent_samples)
+        errors = len([sample for sample in agent_samples if not sample[3]])
+        wall = max(end for _, _, end, _ in agent_samples) - min(start for _, start, _, _ in agent_samples)
+        report[config_name(agent)] = {
+            "calls": len(agent_samples),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "error_rate": errors / len(agent_samples),
+            "throughput": len(agent_samples) / wall if wall > 0 else None,
+        }
+
+    print(f"{'agent':<36}{'calls':>7}{'p50(s)':>9}{'p95(s)':>9}{'p99(s)':>9}{'errors':>9}{'req/s':>8}")
+    for name, stats in report.items():
+        throughput = f"{stats['throughput']:.2f}" if stats['throughput'] is not None else "-"
+        print(f"{name:<36}{stats['calls']:>7}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}"
+              f"{stats['error_rate']:>9.1%}{throughput:>8}")
+
+    with open(output, "w") as f:
+        json.dump({"iterations": iterations, "concurrency": concurrency, "agents": report}, f, indent=2)
+    print(f"benchmark report written to {output}")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="sanity check the os_* agents")
+    parser.add_argument("--benchmark", action="store_true", help="run all agents concurrently and report latency")
+    parser.add_argument("--iterations", type=positive_int, default=5, help="executions per agent in benchmark mode")
+    parser.add_argument("--concurrency", type=positive_int, default=len(agents), help="max executions in flight")
+    parser.add_argument("--output", default="agent_benchmark.json", help="benchmark json report path")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--replay", action="store_true",
+                             help="serve cached agent responses, call and cache the agent on a miss")
+    cache_group.add_argument("--record", action="store_true", help="call every agent and refresh the response cache")
+    args = parser.parse_args()
 
-    index = index + 1
+    mode = "replay" if args.replay else "record" if args.record else "live"
+    if args.benchmark:
+        run_benchmark(args.iterations, args.concurrency, args.output, mode)
+    else:
+        run_sanity(mode)
@@ -1,12 +1,17 @@
 import base64
+import itertools
 import os
 
 import json
 import logging
-from urllib.parse import urlencode
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import parse_qs, urlencode, urlparse
 
-import boto3
-import requests
+# boto3, requests and asyncio are imported on first use, they dominate the module init time of a cold start
 
 # from agents.root_session import get_root_session
 
@@ -15,16 +20,67 @@ logger.setLevel(logging.INFO)
 
 roleArn = os.environ['ROLE_ARN']
 t2ppl_roleArn = os.environ['T2PPL_ROLE_ARN']
+# max datasources rotated in parallel, can be overridden per event with 'max_concurrency'
+max_concurrency = int(os.environ.get('MAX_CONCURRENCY', '8'))
+deadline_margin_seconds = 10
+# proxy responses worth retrying with backoff, everything else is returned to the caller
+retry_status_codes = (429, 502, 503, 504)
+# models deployed / predicted in parallel within one datasource
+model_concurrency = int(os.environ.get('MODEL_CONCURRENCY', '4'))
+model_predict_timeout = float(os.environ.get('MODEL_PREDICT_TIMEOUT', '30'))
+# assumed role credentials are refreshed once they get closer than this to their expiration
+credential_refresh_margin_seconds = int(os.environ.get('CREDENTIAL_REFRESH_MARGIN_SECONDS', '1800'))
+plaintext_cache_ttl_seconds = int(os.environ.get('PLAINTEXT_CACHE_TTL_SECONDS', '3600'))
+# connectors are only rotated when their recorded credentials expire within this window
+rotation_window_seconds = int(os.environ.get('ROTATION_WINDOW_SECONDS', '1800'))
+default_rolling_batch_size = int(os.environ.get('ROLLING_BATCH_SIZE', '0'))
+# request metrics are printed as cloudwatch emf lines ('emf'), written to metrics_path ('json') or dropped ('none')
+metrics_output = os.environ.get('METRICS_OUTPUT', 'emf')
+metrics_namespace = os.environ.get('METRICS_NAMESPACE', 'PlaygroundCredentialRotation')
+metrics_path = os.environ.get('METRICS_PATH', '/tmp/rotation_metrics.json')
+# cloudwatch embedded metric format limit on the values of one metric in one record
+emf_max_values = 100
 
-root_session = boto3.Session()
-# root_session = get_root_session()
+# module level caches survive warm invocations of the same lambda container
+_credentials_cache: dict[str, dict] = {}
+_plaintext_cache: dict[str, tuple[str, float]] = {}
+_cache_lock = threading.Lock()
+_root_session = None
+_aws_clients: dict[str, object] = {}
+_aws_client_lock = threading.Lock()
+
+
+def get_boto_session():
+    global _root_session
+    with _aws_client_lock:
+        if _root_session is None:
+            import boto3
+            _root_session = boto3.Session()
+            # _root_session = get_root_session()
+        return _root_session
+
+
+def aws_client(service: str):
+    # boto3 client creation is slow, build each client once per container and reuse it
+    session = get_boto_session()
+    with _aws_client_lock:
+        if service not in _aws_clients:
+            _aws_clients[service] = session.client(service)
+        return _aws_clients[service]
 
 
 def decrypt_kms(encrypted_text: str):
-    kms_client = root_session.client('kms')
+    with _cache_lock:
+        cached = _plaintext_cache.get(encrypted_text)
+    if cached is not None and time.monotonic() - cached[1] < plaintext_cache_ttl_seconds:
+        return cached[0]
+
+    kms_client = aws_client('kms')
     decrypted_text = kms_client.decrypt(
         CiphertextBlob=base64.b64decode(encrypted_text)
     )['Plaintext'].decode('utf-8')
+    with _cache_lock:
+        _plaintext_cache[encrypted_text] = (decrypted_text, time.monotonic())
     return decrypted_text
 
 
@@ -34,54 +90,223 @@ def lambda_handler(event, context):
     play_ground_host = event['playground_host']
     auth_b64 = event['credential']
     refresh_models_ids = event['refresh_models_ids']
+    concurrency = int(event.get('max_concurrency', max_concurrency))
+    force_rotation = event.get('force_rotation', False)
+    # only compute and return the rotation plan, nothing is undeployed or rotated
+    dry_run = event.get('dry_run', False)
+    # rotate in waves of this many models, 0 rotates every affected model of a datasource at once
+    rolling_batch_size = int(event.get('rolling_batch_size', default_rolling_batch_size))
 
     decrypted_auth = decrypt_kms(auth_b64)
 
     credentials = get_temp_credentials(roleArn)
     t2ppl_credentials = get_temp_credentials(t2ppl_roleArn)
-    client = PlaygroundClient(play_ground_host, datasource_id=None, auth=decrypted_auth)
-    ds_list = client.query_all_datasource()
-    # append an empty datasource for local cluster
-    ds_list.append({'id': '', 'title': 'Local Cluster', 'endpoint': 'localhost'})
-
-    for ds in ds_list:
-        logger.info(f"start process datasource: {ds['id']} - {ds['title']} - {ds['endpoint']}")
-        if is_aos(ds['endpoint']):
-            continue
-        if ds['id'] in [broken_datasource_ids]:
-            continue
-        if len(refresh_datasource_title) > 0 and ds['title'] not in refresh_datasource_title:
-            continue
-        client.set_datasource_id(ds['id'])
-        models = client.query_models()
-        # a list given by user
-        if len(refresh_models_ids) > 0:
-            models = list(filter(lambda x: x['model_id'] in refresh_models_ids, models))
+    ledger = build_rotation_ledger()
+    # all datasources share one connection pool to the dashboards proxy
+    client = PlaygroundClient(play_ground_host, datasource_id=None, auth=decrypted_auth,
+                              pool_size=max(concurrency, 1) * model_concurrency)
+    # stop waiting a little before the lambda times out so the summary can still be returned
+    deadline = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - deadline_margin_seconds
+
+    # an empty datasource for local cluster, first so a failed datasource listing can't skip it
+    ds_iter = itertools.chain([{'id': '', 'title': 'Local Cluster', 'endpoint': 'localhost'}],
+                              client.iter_datasources())
+
+    results = []
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    futures = {}
+    # datasources are submitted while later pages are still being fetched
+    try:
+        for ds in ds_iter:
+            if is_aos(ds['endpoint']):
+                continue
+            if ds['id'] in [broken_datasource_ids]:
+                continue
+            if len(refresh_datasource_title) > 0 and ds['title'] not in refresh_datasource_title:
+                continue
+            future = executor.submit(rotate_datasource, client, ds, refresh_models_ids, credentials,
+                                     t2ppl_credentials, ledger=ledger, force=force_rotation, dry_run=dry_run,
+                                     rolling_batch_size=rolling_batch_size)
+            futures[future] = ds
+    except ListingError as e:
+        # the datasources listed so far still run, the incomplete listing shows up as a failed result
+        logger.error(str(e))
+        results.append(datasource_result({'id': None, 'title': 'data-source listing'}, "incomplete_listing",
+                                         error=str(e)))
+
+    timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
+    done, not_done = wait(futures, timeout=timeout)
+    for future in done:
+        ds = futures[future]
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.exception(f"failed to process datasource: {ds['id']} - {ds['title']}")
+            results.append(datasource_result(ds, "error", error=str(e)))
+    for future in not_done:
+        ds = futures[future]
+        logger.error(f"datasource did not finish before deadline: {ds['id']} - {ds['title']}")
+        results.append(datasource_result(ds, "timeout"))
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    failed = [result for result in results if result['status'] not in ('ok', 'fresh', 'dry_run')]
+    logger.info(f"processed {len(results)} datasources, {len(failed)} failed")
+    emit_metrics(client.metrics)
+    return {"results": results, "metrics": client.metrics.summary()}
+
+
+def rotate_datasource(base_client, ds, refresh_models_ids, credentials, t2ppl_credentials, ledger=None,
+                      force: bool = False, dry_run: bool = False, rolling_batch_size: int = 0):
+    logger.info(f"start process datasource: {ds['id']} - {ds['title']} - {ds['endpoint']}")
+    start = time.monotonic()
+    # one client per datasource, datasource_id is client state and threads must not share it
+    client = base_client.for_datasource(ds['id'])
+    models = client.iter_models()
+    # a list given by user
+    if len(refresh_models_ids) > 0:
+        models = filter(lambda x: x['model_id'] in refresh_models_ids, models)
+    models = list(models)
+
+    # extract model ids
+    model_ids = list(map(lambda model: model['model_id'], models))
+    rotation_plan = plan_connector_rotation(client, models, credentials, t2ppl_credentials,
+                                            ledger=None if force else ledger)
+    # only models backed by a rotated connector need to be undeployed and redeployed
+    affected_model_ids = [model['model_id'] for model in models if model['connector_id'] in rotation_plan]
+    plan = {
+        "connectors": list(rotation_plan),
+        "models": affected_model_ids,
+        "untouched_models": [model_id for model_id in model_ids if model_id not in affected_model_ids],
+    }
+    logger.info(f"rotation plan of datasource {ds['id']}: {json.dumps(plan)}")
+    if dry_run:
+        return datasource_result(ds, "dry_run", models=len(model_ids), elapsed=time.monotonic() - start,
+                                 plan=plan)
+    if len(rotation_plan) == 0:
+        logger.info(f"datasource {ds['id']} has no connector due for rotation, skip")
+        return datasource_result(ds, "fresh", models=len(model_ids), elapsed=time.monotonic() - start)
+
+    if rolling_batch_size > 0:
+        sanity_report, halted = rolling_rotation(client, models, rotation_plan, ledger, rolling_batch_size)
+        if halted:
+            return datasource_result(ds, "halted", error="a rolling wave failed its predict probe",
+                                     models=len(model_ids), elapsed=time.monotonic() - start,
+                                     sanity_report=sanity_report, plan=plan)
+        return datasource_result(ds, "ok", models=len(model_ids), elapsed=time.monotonic() - start,
+                                 sanity_report=sanity_report, plan=plan)
+
+    client.undeploy_model(affected_model_ids)
+
+    rotated = apply_connector_rotation(client, rotation_plan)
+    # update_model_credentials(client, models, credentials, t2ppl_credentials)
+
+    sanity_report = model_sanity_check(client, affected_model_ids)
+    record_verified_rotations(client, ledger, models, rotated, sanity_report)
+    stale = [item['model_id'] for item in sanity_report if item['stale_token']]
+    if len(stale) > 0:
+        logger.error(f"datasource {ds['id']} has models with stale token: {stale}")
+    return datasource_result(ds, "ok", models=len(model_ids), elapsed=time.monotonic() - start,
+                             sanity_report=sanity_report, plan=plan)
+
 
-        # extract model ids
-        model_ids = list(map(lambda model: model['model_id'], models))
-        client.undeploy_model(model_ids)
+def rolling_waves(models, rotation_plan, batch_size: int):
+    # group the affected models by connector, a connector can't be updated while any of its models is
+    # deployed, so a connector group is never split and a wave may exceed batch_size for a large group
+    groups = {}
+    for model in models:
+        if model['connector_id'] in rotation_plan:
+            groups.setdefault(model['connector_id'], []).append(model['model_id'])
+    waves = []
+    wave = {"connectors": [], "models": []}
+    for connector_id, model_ids in groups.items():
+        if len(wave["models"]) > 0 and len(wave["models"]) + len(model_ids) > batch_size:
+            waves.append(wave)
+            wave = {"connectors": [], "models": []}
+        wave["connectors"].append(connector_id)
+        wave["models"].extend(model_ids)
+    if len(wave["models"]) > 0:
+        waves.append(wave)
+    return waves
 
-        update_connector_credentials(client, models, credentials, t2ppl_credentials)
-        # update_model_credentials(client, models, credentials, t2ppl_credentials)
 
-        model_sanity_check(client, model_ids)
+def rolling_rotation(client, models, rotation_plan, ledger, batch_size: int):
+    # rotate wave by wave and only continue once every model of the previous wave answers its predict probe,
+    # models of later waves keep serving in the meantime. returns (sanity report, halted)
+    sanity_report = []
+    waves = rolling_waves(models, rotation_plan, batch_size)
+    for index, wave in enumerate(waves):
+        logger.info(f"rolling wave {index + 1}/{len(waves)}: connectors {wave['connectors']}, models {wave['models']}")
+        client.undeploy_model(wave["models"])
+        rotated = apply_connector_rotation(client, {connector_id: rotation_plan[connector_id]
+                                                    for connector_id in wave["connectors"]})
+        wave_report = model_sanity_check(client, wave["models"])
+        record_verified_rotations(client, ledger, models, rotated, wave_report)
+        sanity_report.extend(wave_report)
+        failed = [item['model_id'] for item in wave_report if item['status_code'] != 200]
+        if len(failed) > 0:
+            logger.error(f"rolling wave {index + 1} failed predict probe on {failed}, stop rotation")
+            return sanity_report, True
+    return sanity_report, False
 
 
-def model_sanity_check(client, model_ids):
-    # loop model_ids and predict
-    for model_id in model_ids:
+def datasource_result(ds, status: str, error: str = None, models: int = 0, elapsed: float = None,
+                      sanity_report: list = None, plan: dict = None):
+    return {
+        "datasource_id": ds['id'],
+        "title": ds['title'],
+        "status": status,
+        "error": error,
+        "models": models,
+        "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+        "sanity_report": sanity_report or [],
+        "plan": plan,
+    }
+
+
+def model_sanity_check(client, model_ids, concurrency: int = None, predict_timeout: float = None):
+    # two stages: deploy every model first, then predict all of them, each stage fanned out on a pool
+    concurrency = max(concurrency or model_concurrency, 1)
+    predict_timeout = predict_timeout or model_predict_timeout
+    report = {model_id: {
+        "model_id": model_id,
+        "deploy_latency": None,
+        "predict_latency": None,
+        "status_code": None,
+        "stale_token": False,
+        "error": None,
+    } for model_id in model_ids}
+    if len(model_ids) == 0:
+        return []
+
+    def deploy(model_id):
+        deploy_res = client.deploy_model(model_id)
+        report[model_id]["deploy_latency"] = round(deploy_res.elapsed, 3)
+        if not deploy_res.ok:
+            report[model_id]["status_code"] = deploy_res.status
+            report[model_id]["error"] = deploy_res.error
+
+    def predict(model_id):
         logger.info(f"perform sanity test on model_id: {model_id}")
-        client.deploy_model(model_id)
-        predict_resp = client.predict_model(model_id)
-        predict_res = json.loads(predict_resp)
-        if 'error' in predict_res:
-            status = predict_res['status']
-            if status == 403:
-                logger.error(f"====Token was not updated====")
-                continue
+        predict_res = client.predict_model(model_id, timeout=predict_timeout)
+        report[model_id]["predict_latency"] = round(predict_res.elapsed, 3)
+        report[model_id]["status_code"] = predict_res.status
+        if not predict_res.ok:
+            report[model_id]["error"] = predict_res.error
+            if predict_res.status == 403:
+                report[model_id]["stale_token"] = True
+                logger.error(f"====Token was not updated==== model_id: {model_id}")
         else:
-            logger.debug(f"predict success: {predict_resp}")
+            logger.debug(f"predict success: {predict_res.text}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(deploy, model_ids))
+        # a model that failed to deploy can't be predicted, keep its deploy error
+        deployed = [model_id for model_id in model_ids if report[model_id]["error"] is None]
+        list(executor.map(predict, deployed))
+
+    return [report[model_id] for model_id in model_ids]
 
 
 def update_model_credentials(client, models, credentials, t2ppl_credentials):
@@ -100,28 +325,169 @@ def update_model_credentials(client, models, credentials, t2ppl_credentials):
             client.rotate_model_token(embedd_model['model_id'], credentials)
 
 
-def update_connector_credentials(client, models, credentials, t2ppl_credentials):
-    connector_ids = list(map(lambda model: model['connector_id'], models))
+def update_connector_credentials(client, models, credentials, t2ppl_credentials, ledger=None):
+    # no predict probe on this path, so nothing is recorded in the ledger
+    rotation_plan = plan_connector_rotation(client, models, credentials, t2ppl_credentials, ledger)
+    apply_connector_rotation(client, rotation_plan)
+
+
+def plan_connector_rotation(client, models, credentials, t2ppl_credentials, ledger=None):
+    # returns {connector_id: credentials} for the bedrock/sagemaker connectors that are due for rotation
+    # many models share a connector, rotate each one only once
+    connector_ids = list(dict.fromkeys(map(lambda model: model['connector_id'], models)))
     # filter out None values
     connector_ids = list(filter(lambda x: x is not None, connector_ids))
+    # seed the cache from connector bodies returned inline by query_models, then fetch the rest in one search
+    for model in models:
+        if model['connector_id'] is not None and model['connector'] is not None:
+            client.connector_cache.put(client.datasource_id, model['connector_id'], model['connector'])
+    client.search_connectors(connector_ids)
+    rotation_plan = {}
     for connector_id in connector_ids:
+        if ledger is not None and not ledger.is_due(client.datasource_id, connector_id, rotation_window_seconds):
+            logger.info(f"connector {connector_id} credentials are still fresh, skip")
+            continue
         connector_type = client.connector_type(connector_id)
         if connector_type['bedrock']:
-            logger.info(f"start processing bedrock connector: {connector_id}, refresh token...")
-            client.rotate_connector_token(connector_id, credentials)
+            rotation_plan[connector_id] = credentials
         elif connector_type['sagemaker']:
-            logger.info(f"start processing sagemaker connector: {connector_id}, refresh token...")
-            client.rotate_connector_token(connector_id, t2ppl_credentials)
+            rotation_plan[connector_id] = t2ppl_credentials
+    return rotation_plan
+
+
+def apply_connector_rotation(client, rotation_plan):
+    # returns {connector_id: new credential expiration} of the connectors whose token was updated
+    rotated = {}
+    for connector_id, connector_credentials in rotation_plan.items():
+        logger.info(f"start processing connector: {connector_id}, refresh token...")
+        rotate_res = client.rotate_connector_token(connector_id, connector_credentials)
+        if not rotate_res.ok:
+            logger.error(f"failed to rotate connector {connector_id}: {rotate_res.error}")
+            continue
+        rotated[connector_id] = connector_credentials['Expiration']
+    return rotated
+
+
+def record_verified_rotations(client, ledger, models, rotated, sanity_report):
+    # a connector only counts as fresh once every one of its models passed the predict probe, otherwise
+    # any earlier entry is dropped so the next run rotates it again instead of skipping it for the whole window
+    if ledger is None:
+        return
+    passed = {item['model_id'] for item in sanity_report if item['status_code'] == 200}
+    for connector_id, expiration in rotated.items():
+        connector_models = [model['model_id'] for model in models if model['connector_id'] == connector_id]
+        if all(model_id in passed for model_id in connector_models):
+            ledger.record(client.datasource_id, connector_id, expiration)
+        else:
+            logger.error(f"connector {connector_id} has models failing the predict probe, not marked as rotated")
+            ledger.forget(client.datasource_id, connector_id)
+
+
+class RotationLedger:
+    # last rotation time and credential expiry per (datasource, connector), backed by a key/value store
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def key(datasource_id: str, connector_id: str) -> str:
+        return f"{datasource_id}#{connector_id}"
+
+    def is_due(self, datasource_id: str, connector_id: str, window_seconds: int) -> bool:
+        entry = self.store.get(self.key(datasource_id, connector_id))
+        if entry is None:
+            return True
+        return entry['expires_at'] - time.time() <= window_seconds
+
+    def record(self, datasource_id: str, connector_id: str, expiration: datetime):
+        self.store.put(self.key(datasource_id, connector_id), {
+            "rotated_at": int(time.time()),
+            "expires_at": int(expiration.timestamp()),
+        })
+
+    def forget(self, datasource_id: str, connector_id: str):
+        self.store.delete(self.key(datasource_id, connector_id))
+
+
+class DynamoDBLedgerStore:
+    # table with a string partition key named ledger_key
+    # uses the cached low-level client, boto3 clients are thread-safe while resources are not
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+
+    def get(self, key: str):
+        item = aws_client('dynamodb').get_item(TableName=self.table_name,
+                                               Key={"ledger_key": {"S": key}}).get('Item')
+        if item is None:
+            return None
+        return {"rotated_at": int(item['rotated_at']['N']), "expires_at": int(item['expires_at']['N'])}
+
+    def put(self, key: str, entry: dict):
+        item = {"ledger_key": {"S": key}}
+        item.update({name: {"N": str(value)} for name, value in entry.items()})
+        aws_client('dynamodb').put_item(TableName=self.table_name, Item=item)
+
+    def delete(self, key: str):
+        aws_client('dynamodb').delete_item(TableName=self.table_name, Key={"ledger_key": {"S": key}})
+
+
+class LocalLedgerStore:
+    # json file stand-in for the dynamodb table, for local runs and tests
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def get(self, key: str):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, entry: dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._save()
+
+    def delete(self, key: str):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self._entries, f)
+
+
+def build_rotation_ledger():
+    # no ledger configured means every connector is rotated on each run
+    if os.environ.get('ROTATION_LEDGER_TABLE'):
+        return RotationLedger(DynamoDBLedgerStore(os.environ['ROTATION_LEDGER_TABLE']))
+    if os.environ.get('ROTATION_LEDGER_PATH'):
+        return RotationLedger(LocalLedgerStore(os.environ['ROTATION_LEDGER_PATH']))
+    return None
 
 
 def get_temp_credentials(role: str):
-    sts = root_session.client('sts')
+    # reuse the assumed role while it stays valid for longer than the refresh margin,
+    # the credentials are written into connectors so they must outlive the next rotation
+    with _cache_lock:
+        cached = _credentials_cache.get(role)
+    if cached is not None:
+        remaining = (cached['Expiration'] - datetime.now(timezone.utc)).total_seconds()
+        if remaining > credential_refresh_margin_seconds:
+            logger.info(f"reuse cached credentials of {role}, expire in {int(remaining)}s")
+            return cached
+
+    sts = aws_client('sts')
     assumed_role = sts.assume_role(
         RoleArn=role,
         RoleSessionName="AssumeRoleSession",
         DurationSeconds=3600
     )
     credentials = assumed_role['Credentials']
+    with _cache_lock:
+        _credentials_cache[role] = credentials
     return credentials
 
 
@@ -132,11 +498,314 @@ def is_aos(endpoint: str) -> bool:
     return aos or aos_dual_stack
 
 
+def build_http_session(pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5) -> 'requests.Session':
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # keep-alive session with a connection pool sized for the number of concurrent callers.
+    # the session is only read after construction, so it is safe to share between threads
+    # only throttling/unavailable statuses and failed connects are retried: a read timeout or a dropped
+    # connection may already have reached the model, and resending _predict/_deploy or a connector PUT
+    # bills another call and stretches the caller's timeout
+    retry = Retry(
+        total=None,
+        connect=retries,
+        read=0,
+        other=0,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=retry_status_codes,
+        # the console proxy only takes POST/GET, so retry the statuses above regardless of method
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ListingError(Exception):
+    # a page of a datasource or model listing failed, rotating what was listed so far would silently skip the rest
+    pass
+
+
+class ProxyResponse:
+    # outcome of one proxy call: real http status (None when the request raised), raw body,
+    # elapsed seconds; the body is only decoded when json() is first called
+    def __init__(self, status: int, content: bytes, elapsed: float, error: str = None):
+        self.status = status
+        self.content = content
+        self.elapsed = elapsed
+        self._error = error
+        self._json = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200 and self._error is None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    @property
+    def error(self):
+        if self._error is not None:
+            return self._error
+        return None if self.ok else self.text
+
+    def json(self):
+        if self._json is None:
+            self._json = json.loads(self.content)
+        return self._json
+
+
+def classify_operation(endpoint: str, method: str) -> str:
+    # map a proxy call to the logical operation it performs, e.g. deploy, predict, rotate
+    parsed = urlparse(endpoint)
+    if parsed.path.endswith('/api/saved_objects/_find'):
+        return "query_datasource"
+    query = parse_qs(parsed.query)
+    path = query.get('path', [''])[0]
+    proxy_method = query.get('method', [method])[0].upper()
+    if path.endswith('/models/_search'):
+        return "query_models"
+    for suffix, operation in (('/_undeploy', 'undeploy'), ('/_deploy', 'deploy'), ('/_predict', 'predict'),
+                              ('/connectors/_search', 'search_connectors')):
+        if path.endswith(suffix):
+            return operation
+    if '/connectors/' in path:
+        return "rotate" if proxy_method == 'PUT' else "get_connector"
+    if '/models/' in path and proxy_method == 'PUT':
+        return "rotate_model"
+    return "other"
+
+
+class RequestMetrics:
+    # latency histogram, status codes, bytes and retries per operation and per datasource for one run
+    latency_buckets_ms = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: list[dict] = []
+
+    def record(self, operation: str, datasource_id: str, latency_ms: float, status: int, size: int, retries: int):
+        with self._lock:
+            self._samples.append({
+                "operation": operation,
+                "datasource_id": datasource_id,
+                "latency_ms": latency_ms,
+                "status": status,
+                "bytes": size,
+                "retries": retries,
+            })
+
+    def _aggregate(self, samples: list[dict]) -> dict:
+        latencies = sorted(sample['latency_ms'] for sample in samples)
+        histogram = {f"le_{bucket}": 0 for bucket in self.latency_buckets_ms}
+        histogram["le_inf"] = 0
+        for latency in latencies:
+            bucket = next((b for b in self.latency_buckets_ms if latency <= b), None)
+            histogram[f"le_{bucket}" if bucket is not None else "le_inf"] += 1
+        status_codes = {}
+        for sample in samples:
+            status = str(sample['status']) if sample['status'] is not None else "exception"
+            status_codes[status] = status_codes.get(status, 0) + 1
+        return {
+            "count": len(samples),
+            "errors": len([sample for sample in samples if sample['status'] != 200]),
+            "total_ms": round(sum(latencies), 1),
+            # nearest-rank percentiles
+            "p50_ms": round(latencies[max(math.ceil(0.5 * len(latencies)) - 1, 0)], 1),
+            "p95_ms": round(latencies[max(math.ceil(0.95 * len(latencies)) - 1, 0)], 1),
+            "max_ms": round(latencies[-1], 1),
+            "bytes": sum(sample['bytes'] for sample in samples),
+            "retries": sum(sample['retries'] for sample in samples),
+            "status_codes": status_codes,
+            "latency_histogram": histogram,
+        }
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+        by_operation = {}
+        by_datasource = {}
+        for sample in samples:
+            by_operation.setdefault(sample['operation'], []).append(sample)
+            by_datasource.setdefault(sample['datasource_id'] or 'local', []).append(sample)
+        return {
+            "operations": {key: self._aggregate(value) for key, value in by_operation.items()},
+            "datasources": {key: self._aggregate(value) for key, value in by_datasource.items()},
+        }
+
+    def emf_records(self, namespace: str) -> list[dict]:
+        # one CloudWatch embedded metric format record per (operation, datasource)
+        with self._lock:
+            samples = list(self._samples)
+        groups = {}
+        for sample in samples:
+            groups.setdefault((sample['operation'], sample['datasource_id'] or 'local'), []).append(sample)
+        records = []
+        for (operation, datasource_id), samples_of_group in groups.items():
+            # cloudwatch only extracts a metric with at most 100 values, so split big groups; the counters
+            # are per record and cloudwatch sums them back up
+            for offset in range(0, len(samples_of_group), emf_max_values):
+                group = samples_of_group[offset:offset + emf_max_values]
+                records.append(self._emf_record(namespace, operation, datasource_id, group))
+        return records
+
+    @staticmethod
+    def _emf_record(namespace: str, operation: str, datasource_id: str, group: list[dict]) -> dict:
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [["Operation"], ["Operation", "DataSource"]],
+                    "Metrics": [
+                        {"Name": "Latency", "Unit": "Milliseconds"},
+                        {"Name": "Errors", "Unit": "Count"},
+                        {"Name": "Bytes", "Unit": "Bytes"},
+                        {"Name": "Retries", "Unit": "Count"},
+                    ]
+                }]
+            },
+            "Operation": operation,
+            "DataSource": datasource_id,
+            "Latency": [round(sample['latency_ms'], 1) for sample in group],
+            "Errors": len([sample for sample in group if sample['status'] != 200]),
+            "Bytes": sum(sample['bytes'] for sample in group),
+            "Retries": sum(sample['retries'] for sample in group),
+        }
+
+
+def emit_metrics(metrics: RequestMetrics):
+    # emf lines go straight to stdout, the lambda log prefix would break the embedded metric format
+    if metrics_output == 'emf':
+        for record in metrics.emf_records(metrics_namespace):
+            print(json.dumps(record))
+    elif metrics_output == 'json':
+        with open(metrics_path, 'w') as f:
+            json.dump(metrics.summary(), f, indent=2)
+        logger.info(f"request metrics written to {metrics_path}")
+
+
+def connector_url(connector: dict):
+    if connector is None or len(connector.get('actions') or []) == 0:
+        return None
+    return connector['actions'][0].get('url')
+
+
+def connector_kind(connector: dict) -> dict[str, bool]:
+    # a connector without actions or url is neither, so it is never rotated
+    url = connector_url(connector)
+    if url is None:
+        return {"bedrock": False, "sagemaker": False}
+    logger.info(f"connector url: {url}")
+    return {
+        "bedrock": "bedrock" in url,
+        "sagemaker": "sagemaker" in url,
+    }
+
+
+# url and query builders shared by PlaygroundClient and AsyncPlaygroundClient
+def proxy_endpoint(dev_tool_proxy: str, path: str, method: str, datasource_id: str) -> str:
+    parameters = {
+        "path": path,
+        "method": method,
+        "dataSourceId": datasource_id
+    }
+    return f"{dev_tool_proxy}?{urlencode(parameters)}"
+
+
+def datasource_page_url(host: str, page: int, per_page: int) -> str:
+    return f'{host}/api/saved_objects/_find?fields=id&fields=endpoint&fields=title&fields=dataSourceVersion&fields=dataSourceEngineType&type=data-source&{urlencode({"page": page, "per_page": per_page})}'
+
+
+def datasource_from_saved_object(saved_object: dict) -> dict:
+    return {
+        "id": saved_object['id'],
+        "title": saved_object['attributes']['title'],
+        "endpoint": saved_object['attributes']['endpoint']
+    }
+
+
+def is_last_datasource_page(ds_list: dict, page: int, per_page: int) -> bool:
+    return len(ds_list['saved_objects']) < per_page or page * per_page >= ds_list.get('total', 0)
+
+
+def deployed_models_query(page_size: int) -> dict:
+    return {
+        "_source": ["_id", "connector_id", "model_state", "connector"],
+        "size": page_size,
+        "query": {
+            "bool": {
+                "must": [
+                    {
+                        "term": {
+                            "algorithm": {
+                                "value": "REMOTE"
+                            }
+                        }
+                    },
+                    {
+                        "term": {
+                            "model_state": {
+                                "value": "DEPLOYED"
+                            }
+                        }
+                    }
+                ]
+            }
+        },
+        "sort": [{"_id": "asc"}]
+    }
+
+
+def model_from_hit(hit: dict) -> dict:
+    return {
+        "model_id": hit['_id'],
+        "connector_id": hit['_source'].get('connector_id'),
+        "connector": hit['_source'].get('connector')
+    }
+
+
+class ConnectorCache:
+    # connector bodies keyed by (datasource_id, connector_id), shared by every client of one rotation run
+    def __init__(self):
+        self._connectors: dict[tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, datasource_id: str, connector_id: str):
+        with self._lock:
+            return self._connectors.get((datasource_id, connector_id))
+
+    def put(self, datasource_id: str, connector_id: str, connector: dict):
+        with self._lock:
+            self._connectors[(datasource_id, connector_id)] = connector
+
+    def missing(self, datasource_id: str, connector_ids: list[str]):
+        with self._lock:
+            return [connector_id for connector_id in connector_ids
+                    if (datasource_id, connector_id) not in self._connectors]
+
+
 class PlaygroundClient:
-    def __init__(self, host: str, auth: str, datasource_id: str = None):
+    def __init__(self, host: str, auth: str, datasource_id: str = None, session: 'requests.Session' = None,
+                 pool_size: int = 10, timeout: tuple[float, float] = (5, 60),
+                 connector_cache: ConnectorCache = None, metrics: RequestMetrics = None):
         self.host = host
+        self.auth = auth
         self.dev_tool_proxy = f"{host}/api/console/proxy"
         self.datasource_id = datasource_id
+        self.session = session if session is not None else build_http_session(pool_size)
+        # (connect, read) timeout in seconds for every proxy call
+        self.timeout = timeout
+        self.connector_cache = connector_cache if connector_cache is not None else ConnectorCache()
+        self.metrics = metrics if metrics is not None else RequestMetrics()
         self.headers = {
             "Content-type": "application/json",
             "osd-xsrf": "osd-fetch",
@@ -147,81 +816,64 @@ class PlaygroundClient:
     def set_datasource_id(self, datasource_id: str):
         self.datasource_id = datasource_id
 
-    def send_request(self, endpoint: str, payload: object, method="post"):
+    def for_datasource(self, datasource_id: str):
+        # a client bound to another datasource that reuses this client's connection pool
+        return PlaygroundClient(self.host, self.auth, datasource_id=datasource_id, session=self.session,
+                                timeout=self.timeout, connector_cache=self.connector_cache, metrics=self.metrics)
+
+    def send_request(self, endpoint: str, payload: object, method="post", timeout=None) -> ProxyResponse:
+        operation = classify_operation(endpoint, method)
+        start = time.monotonic()
         try:
-            response = requests.request(method, url=endpoint, headers=self.headers, json=payload)
-            logger.debug(response.text)
-            if response.status_code != 200:
-                return json.dumps({"error": response.text})
-            return response.text
+            response = self.session.request(method, url=endpoint, headers=self.headers, json=payload,
+                                            timeout=timeout or self.timeout)
+            elapsed = time.monotonic() - start
+            retry = getattr(response.raw, 'retries', None)
+            self.metrics.record(operation, self.datasource_id, elapsed * 1000, response.status_code,
+                                len(response.content), len(retry.history) if retry is not None else 0)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(response.text)
+            return ProxyResponse(response.status_code, response.content, elapsed)
         except Exception as e:
-            return json.dumps({"error": str(e)})
+            elapsed = time.monotonic() - start
+            self.metrics.record(operation, self.datasource_id, elapsed * 1000, None, 0, 0)
+            return ProxyResponse(None, b"", elapsed, error=str(e))
 
-    def query_all_datasource(self):
-        host = f'{self.host}/api/saved_objects/_find?fields=id&fields=endpoint&fields=title&fields=dataSourceVersion&fields=dataSourceEngineType&per_page=10000&type=data-source'
-        ds_response = self.send_request(host, {}, method="get")
-        ds_list = json.loads(ds_response)
-        # saved_objects
-        saved_objects = ds_list['saved_objects']
-        # convert to a dict keys is id value is title
-        saved_objects = list(map(lambda saved_object: {
-            "id": saved_object['id'],
-            "title": saved_object['attributes']['title'],
-            "endpoint": saved_object['attributes']['endpoint']
-        }, saved_objects))
-
-        return saved_objects
+    def iter_datasources(self, per_page: int = 100):
+        # page through the data-source saved objects, yielding each one as soon as its page arrives
+        page = 1
+        while True:
+            ds_response = self.send_request(datasource_page_url(self.host, page, per_page), {}, method="get")
+            if not ds_response.ok:
+                raise ListingError(f"failed to query datasource page {page}: {ds_response.error}")
+            ds_list = ds_response.json()
+            for saved_object in ds_list['saved_objects']:
+                yield datasource_from_saved_object(saved_object)
+            if is_last_datasource_page(ds_list, page, per_page):
+                return
+            page += 1
 
-    def query_models(self):
-        query_body = {
-            "_source": ["_id", "connector_id", "model_state", "connector"],
-            "size": 1000,
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "term": {
-                                "algorithm": {
-                                    "value": "REMOTE"
-                                }
-                            }
-                        },
-                        {
-                            "term": {
-                                "model_state": {
-                                    "value": "DEPLOYED"
-                                }
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-
-        model_search_parameters = {
-            "path": "/_plugins/_ml/models/_search",
-            "method": "GET",
-            "dataSourceId": self.datasource_id
-        }
+    def query_all_datasource(self):
+        return list(self.iter_datasources())
 
-        endpoint = f"{self.dev_tool_proxy}?{urlencode(model_search_parameters)}"
-        models_text = self.send_request(endpoint, payload=query_body)
-        model_json = json.loads(models_text)
-        # if model_json has error
-        if 'error' in model_json or model_json["hits"]["total"] == 0:
-            return []
-        models = []
-        for model in model_json['hits']['hits']:
-            model_id = model['_id']
-            connector_id = model['_source']['connector_id'] if 'connector_id' in model['_source'] else None
-            connector = model['_source']['connector'] if 'connector' in model['_source'] else None
-            models.append({
-                "model_id": model_id,
-                "connector_id": connector_id,
-                "connector": connector
-            })
+    def iter_models(self, page_size: int = 100):
+        # page through deployed remote models with search_after instead of one capped search
+        query_body = deployed_models_query(page_size)
+        endpoint = proxy_endpoint(self.dev_tool_proxy, "/_plugins/_ml/models/_search", "GET", self.datasource_id)
+        while True:
+            models_response = self.send_request(endpoint, payload=query_body)
+            if not models_response.ok:
+                raise ListingError(f"failed to search models of datasource {self.datasource_id}: "
+                                   f"{models_response.error}")
+            hits = models_response.json()['hits']['hits']
+            for hit in hits:
+                yield model_from_hit(hit)
+            if len(hits) < page_size:
+                return
+            query_body["search_after"] = hits[-1]['sort']
 
-        return models
+    def query_models(self):
+        return list(self.iter_models())
 
     def undeploy_model(self, model_ids: list[str]):
         undeploy_body = {
@@ -236,7 +888,7 @@ class PlaygroundClient:
 
         endpoint = f"{self.dev_tool_proxy}?{urlencode(undeploy_parameters)}"
 
-        self.send_request(endpoint, undeploy_body)
+        return self.send_request(endpoint, undeploy_body)
 
     def deploy_model(self, model_id: str):
         deploy_parameters = {
@@ -247,7 +899,7 @@ class PlaygroundClient:
 
         endpoint = f"{self.dev_tool_proxy}?{urlencode(deploy_parameters)}"
 
-        self.send_request(endpoint, {})
+        return self.send_request(endpoint, {})
 
     def rotate_connector_token(self, connector_id: str, credentials: dict[str, str]):
         rotate_body = {
@@ -266,7 +918,7 @@ class PlaygroundClient:
 
         endpoint = f"{self.dev_tool_proxy}?{urlencode(rotate_parameters)}"
 
-        self.send_request(endpoint, rotate_body)
+        return self.send_request(endpoint, rotate_body)
 
     def rotate_model_token(self, model_id: str, credentials: dict[str, str]):
         rotate_body = {
@@ -287,32 +939,53 @@ class PlaygroundClient:
 
         endpoint = f"{self.dev_tool_proxy}?{urlencode(rotate_parameters)}"
 
-        self.send_request(endpoint, rotate_body)
+        return self.send_request(endpoint, rotate_body)
 
-    def connector_type(self, connector_id: str):
-        get_connector_parameters = {
-            "path": f"/_plugins/_ml/connectors/{connector_id}",
-            "method": "GET",
+    def search_connectors(self, connector_ids: list[str]):
+        # fetch every connector not cached yet with a single ids query
+        missing = self.connector_cache.missing(self.datasource_id, connector_ids)
+        if len(missing) == 0:
+            return
+        search_parameters = {
+            "path": "/_plugins/_ml/connectors/_search",
+            "method": "POST",
             "dataSourceId": self.datasource_id
         }
+        query_body = {
+            "size": len(missing),
+            "query": {
+                "ids": {
+                    "values": missing
+                }
+            }
+        }
 
-        endpoint = f"{self.dev_tool_proxy}?{urlencode(get_connector_parameters)}"
+        endpoint = f"{self.dev_tool_proxy}?{urlencode(search_parameters)}"
+        response = self.send_request(endpoint, query_body)
+        if not response.ok:
+            logger.warning(f"connector search failed, fall back to single lookups: {response.error}")
+            return
+        for hit in response.json()['hits']['hits']:
+            self.connector_cache.put(self.datasource_id, hit['_id'], hit['_source'])
 
-        response_text = self.send_request(endpoint, {})
-        r_json = json.loads(response_text)
-        if 'error' in r_json:
+    def connector_type(self, connector_id: str):
+        connector = self.connector_cache.get(self.datasource_id, connector_id)
+        if connector is not None and connector_url(connector) is not None:
+            return connector_kind(connector)
+
+        endpoint = proxy_endpoint(self.dev_tool_proxy, f"/_plugins/_ml/connectors/{connector_id}", "GET",
+                                  self.datasource_id)
+        response = self.send_request(endpoint, {})
+        if not response.ok:
             return {
                 "bedrock": False,
                 "sagemaker": False
             }
-        url: str = r_json['actions'][0]['url']
-        logger.info(f"connector url: {url}")
-        return {
-            "bedrock": "bedrock" in url,
-            "sagemaker": "sagemaker" in url,
-        }
+        r_json = response.json()
+        self.connector_cache.put(self.datasource_id, connector_id, r_json)
+        return connector_kind(r_json)
 
-    def predict_model(self, model_id: str):
+    def predict_model(self, model_id: str, timeout=None):
         invoke_parameters = {
             "path": f"/_plugins/_ml/models/{model_id}/_predict",
             "method": "POST",
@@ -328,4 +1001,186 @@ class PlaygroundClient:
             }
         }
 
-        return self.send_request(endpoint, payload)
+        return self.send_request(endpoint, payload, timeout=timeout)
+
+
+class AsyncPlaygroundClient:
+    # asyncio twin of PlaygroundClient for a single event loop rotation run. clients derived with
+    # for_datasource share one httpx connection pool, the per-datasource concurrency limits and the deadline
+    def __init__(self, host: str, auth: str, datasource_id: str = None, http_client=None,
+                 max_connections: int = 100, per_datasource_limit: int = 8, timeout: float = 60.0,
+                 deadline: float = None, retries: int = 3, backoff_factor: float = 0.5,
+                 connector_cache: ConnectorCache = None, semaphores: dict = None,
+                 metrics: RequestMetrics = None):
+        # deferred so the synchronous rotation path does not pay for the import
+        import httpx
+
+        self.host = host
+        self.auth = auth
+        self.dev_tool_proxy = f"{host}/api/console/proxy"
+        self.datasource_id = datasource_id
+        self.http_client = http_client if http_client is not None else httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+        )
+        self._client_default_timeout = httpx.USE_CLIENT_DEFAULT
+        self.per_datasource_limit = per_datasource_limit
+        # event loop time after which in-flight and new requests are cancelled
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.connector_cache = connector_cache if connector_cache is not None else ConnectorCache()
+        self.semaphores = semaphores if semaphores is not None else {}
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        self.headers = {
+            "Content-type": "application/json",
+            "osd-xsrf": "osd-fetch",
+            "Authorization": auth
+        }
+
+    def for_datasource(self, datasource_id: str):
+        return AsyncPlaygroundClient(self.host, self.auth, datasource_id=datasource_id,
+                                     http_client=self.http_client, per_datasource_limit=self.per_datasource_limit,
+                                     deadline=self.deadline, retries=self.retries,
+                                     backoff_factor=self.backoff_factor, connector_cache=self.connector_cache,
+                                     semaphores=self.semaphores, metrics=self.metrics)
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _semaphore(self):
+        import asyncio
+
+        if self.datasource_id not in self.semaphores:
+            self.semaphores[self.datasource_id] = asyncio.Semaphore(self.per_datasource_limit)
+        return self.semaphores[self.datasource_id]
+
+    async def _request_with_retry(self, method: str, endpoint: str, payload: object, timeout=None):
+        import asyncio
+
+        attempt = 0
+        while True:
+            response = await self.http_client.request(method.upper(), endpoint, headers=self.headers,
+                                                      json=payload,
+                                                      timeout=timeout or self._client_default_timeout)
+            if response.status_code not in retry_status_codes or attempt >= self.retries:
+                return response, attempt
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def send_request(self, endpoint: str, payload: object, method="post", timeout=None) -> ProxyResponse:
+        # deferred like httpx, only the async client needs asyncio
+        import asyncio
+
+        operation = classify_operation(endpoint, method)
+        start = time.monotonic()
+        try:
+            async with self._semaphore():
+                request = self._request_with_retry(method, endpoint, payload, timeout)
+                if self.deadline is not None:
+                    remaining = self.deadline - asyncio.get_running_loop().time()
+                    response, retries = await asyncio.wait_for(request, timeout=max(remaining, 0))
+                else:
+                    response, retries = await request
+            elapsed = time.monotonic() - start
+            self.metrics.record(operation, self.datasource_id, elapsed * 1000, response.status_code,
+                                len(response.content), retries)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(response.text)
+            return ProxyResponse(response.status_code, response.content, elapsed)
+        except asyncio.TimeoutError:
+            elapsed = time.monotonic() - start
+            self.metrics.record(operation, self.datasource_id, elapsed * 1000, None, 0, 0)
+            return ProxyResponse(None, b"", elapsed, error=f"request cancelled at deadline: {endpoint}")
+        except Exception as e:
+            elapsed = time.monotonic() - start
+            self.metrics.record(operation, self.datasource_id, elapsed * 1000, None, 0, 0)
+            return ProxyResponse(None, b"", elapsed, error=str(e))
+
+    def _proxy_endpoint(self, path: str, method: str):
+        return proxy_endpoint(self.dev_tool_proxy, path, method, self.datasource_id)
+
+    async def iter_datasources(self, per_page: int = 100):
+        page = 1
+        while True:
+            ds_response = await self.send_request(datasource_page_url(self.host, page, per_page), {}, method="get")
+            if not ds_response.ok:
+                raise ListingError(f"failed to query datasource page {page}: {ds_response.error}")
+            ds_list = ds_response.json()
+            for saved_object in ds_list['saved_objects']:
+                yield datasource_from_saved_object(saved_object)
+            if is_last_datasource_page(ds_list, page, per_page):
+                return
+            page += 1
+
+    async def query_all_datasource(self):
+        return [ds async for ds in self.iter_datasources()]
+
+    async def iter_models(self, page_size: int = 100):
+        query_body = deployed_models_query(page_size)
+        endpoint = self._proxy_endpoint("/_plugins/_ml/models/_search", "GET")
+        while True:
+            models_response = await self.send_request(endpoint, payload=query_body)
+            if not models_response.ok:
+                raise ListingError(f"failed to search models of datasource {self.datasource_id}: "
+                                   f"{models_response.error}")
+            hits = models_response.json()['hits']['hits']
+            for hit in hits:
+                yield model_from_hit(hit)
+            if len(hits) < page_size:
+                return
+            query_body["search_after"] = hits[-1]['sort']
+
+    async def query_models(self):
+        return [model async for model in self.iter_models()]
+
+    async def undeploy_model(self, model_ids: list[str]):
+        endpoint = self._proxy_endpoint("/_plugins/_ml/models/_undeploy", "POST")
+        return await self.send_request(endpoint, {"model_ids": model_ids})
+
+    async def deploy_model(self, model_id: str):
+        endpoint = self._proxy_endpoint(f"/_plugins/_ml/models/{model_id}/_deploy", "POST")
+        return await self.send_request(endpoint, {})
+
+    async def rotate_connector_token(self, connector_id: str, credentials: dict[str, str]):
+        rotate_body = {
+            "credential": {
+                "access_key": credentials['AccessKeyId'],
+                "secret_key": credentials['SecretAccessKey'],
+                "session_token": credentials['SessionToken']
+            }
+        }
+        endpoint = self._proxy_endpoint(f"/_plugins/_ml/connectors/{connector_id}", "PUT")
+        return await self.send_request(endpoint, rotate_body)
+
+    async def connector_type(self, connector_id: str):
+        connector = self.connector_cache.get(self.datasource_id, connector_id)
+        if connector is None or connector_url(connector) is None:
+            endpoint = self._proxy_endpoint(f"/_plugins/_ml/connectors/{connector_id}", "GET")
+            response = await self.send_request(endpoint, {})
+            if not response.ok:
+                return {
+                    "bedrock": False,
+                    "sagemaker": False
+                }
+            r_json = response.json()
+            self.connector_cache.put(self.datasource_id, connector_id, r_json)
+            connector = r_json
+        return connector_kind(connector)
+
+    async def predict_model(self, model_id: str, timeout=None):
+        endpoint = self._proxy_endpoint(f"/_plugins/_ml/models/{model_id}/_predict", "POST")
+        payload = {
+            "parameters": {
+                "prompt": "How are you",
+                "inputText": "hello",
+                "input": "hello"
+            }
+        }
+        return await self.send_request(endpoint, payload, timeout=timeout)
@@ -0,0 +1,98 @@
+import argparse
+import json
+import math
+import re
+
+from workflow_templates import agents_template, claude_model_template
+
+# size every tool prompt of the Olly II Agents workflow and estimate its token cost per agent execution
+# usage: python ./agents/prompt_report.py --output prompt_report.json
+
+# prompts above these estimated input token counts are flagged
+warn_tokens = 1500
+high_tokens = 3000
+
+_token_pattern = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]|\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    # local approximation of a bpe tokenizer: long words split into ~4 character pieces, digits into
+    # groups of 3, every punctuation mark is a token, a whitespace run is one token
+    tokens = 0
+    for piece in _token_pattern.findall(text):
+        if piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+
+def max_output_tokens() -> int:
+    # max_tokens_to_sample configured on the claude connector every tool prompt is sent to
+    connector = claude_model_template({}, "")["workflows"]["provision"]["nodes"][0]
+    return int(connector["user_inputs"]["parameters"]["max_tokens_to_sample"])
+
+
+def collect_prompts(template: dict) -> list[dict]:
+    prompts = []
+    for node in template["workflows"]["provision"]["nodes"]:
+        prompt = node.get("user_inputs", {}).get("parameters", {}).get("prompt")
+        if prompt is None:
+            continue
+        prompts.append({"node": node["id"], "tool": node["user_inputs"].get("name"), "prompt": prompt})
+    return prompts
+
+
+def analyze_prompt(prompt: str) -> dict:
+    lines = prompt.split("\n")
+    # indentation inherited from the python source is sent on every call as well
+    indentation = sum(len(line) - len(line.lstrip(" \t")) for line in lines)
+    tokens = estimate_tokens(prompt)
+    return {
+        "chars": len(prompt),
+        "lines": len(lines),
+        "indentation_chars": indentation,
+        "placeholders": len(re.findall(r"\$\{[^}]+}", prompt)),
+        "estimated_tokens": tokens,
+        "flag": "high" if tokens >= high_tokens else "warn" if tokens >= warn_tokens else "",
+    }
+
+
+def build_report() -> dict:
+    output_tokens = max_output_tokens()
+    tools = []
+    for entry in collect_prompts(agents_template("<model_id>")):
+        stats = analyze_prompt(entry["prompt"])
+        stats["request_token_budget"] = stats["estimated_tokens"] + output_tokens
+        tools.append({"node": entry["node"], "tool": entry["tool"], **stats})
+    tools.sort(key=lambda tool: tool["estimated_tokens"], reverse=True)
+    return {
+        "max_tokens_to_sample": output_tokens,
+        "thresholds": {"warn": warn_tokens, "high": high_tokens},
+        "total_estimated_tokens": sum(tool["estimated_tokens"] for tool in tools),
+        "tools": tools,
+    }
+
+
+def print_report(report: dict):
+    print(f"{'node':<48}{'chars':>8}{'lines':>7}{'indent':>8}{'~tokens':>9}  flag")
+    for tool in report["tools"]:
+        print(f"{tool['node']:<48}{tool['chars']:>8}{tool['lines']:>7}{tool['indentation_chars']:>8}"
+              f"{tool['estimated_tokens']:>9}  {tool['flag']}")
+    print(f"total ~{report['total_estimated_tokens']} prompt tokens, "
+          f"each call may also generate up to {report['max_tokens_to_sample']} tokens")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="report size and estimated tokens of the tool prompts")
+    parser.add_argument("--output", default="", help="optional json report path")
+    args = parser.parse_args()
+
+    prompt_report = build_report()
+    print_report(prompt_report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(prompt_report, f, indent=2)
+        print(f"prompt report written to {args.output}")